@@ -1,17 +1,51 @@
 import streamlit as st
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 import re
+import os
+import shutil
+import string
 import io
 import time
 import html
+import json
+import base64
+import atexit
+import threading
+
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+_SHARE_URL_PREFIXES = (
+    'https://chat.openai.com/share/',
+    'http://chat.openai.com/share/',
+    'https://chatgpt.com/share/',
+    'http://chatgpt.com/share/'
+)
+
+_SHARE_ID_CHARS = frozenset(string.ascii_letters + string.digits + '-')
+
+_MAX_SHARE_ID_LENGTH = 128
+
+# Share pages fetch the conversation as JSON from this backend endpoint
+_SHARE_API_PATH = '/backend-api/share/'
+
+_ROLE_LABELS = {'user': 'You', 'assistant': 'ChatGPT'}
+
+# Collects [role, message] pairs in a single WebDriver round-trip
+_EXTRACT_CONVERSATION_JS = """
+const roles = document.querySelectorAll("div[class*='font-semibold']");
+return Array.from(document.querySelectorAll("div[class*='markdown']")).map(
+    (el, i) => [roles[i] ? roles[i].innerText : 'Unknown', el.innerText]
+);
+"""
 
 def clean_text_for_pdf(text):
     """Clean and prepare text for PDF generation."""
@@ -25,29 +59,24 @@ def clean_text_for_pdf(text):
     text = text.replace('\u201c', '"')
     text = text.replace('\u201d', '"')
     text = text.replace('```', '')
-    text = re.sub(r'\n\s*\n', '\n', text)
+    text = _BLANK_LINES_RE.sub('\n', text)
     return text
 
 def validate_chat_url(url):
     """Validate if the URL matches ChatGPT share link patterns."""
     url = url.strip()
-    patterns = [
-        r'^https?:\/\/chat\.openai\.com\/share\/[a-zA-Z0-9-]+$',
-        r'^https?:\/\/chatgpt\.com\/share\/[a-zA-Z0-9-]+$'
-    ]
-    
-    for pattern in patterns:
-        if re.match(pattern, url):
-            if 'chatgpt.com' in url:
-                return url.replace('chatgpt.com', 'chat.openai.com')
-            return url
-    return None
-
-def create_pdf(conversation, include_metadata=True):
-    """Create a PDF from the conversation content with optional metadata."""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    if not url.startswith(_SHARE_URL_PREFIXES):
+        return None
+    
+    share_id = url[url.index('/share/') + len('/share/'):]
+    if not 1 <= len(share_id) <= _MAX_SHARE_ID_LENGTH or not _SHARE_ID_CHARS.issuperset(share_id):
+        return None
     
+    return url.replace('chatgpt.com', 'chat.openai.com', 1)
+
+@st.cache_resource
+def get_pdf_styles():
+    """Build the PDF paragraph styles once per process; they are read-only after construction."""
     styles = getSampleStyleSheet()
     title_style = ParagraphStyle(
         'CustomTitle',
@@ -77,6 +106,15 @@ def create_pdf(conversation, include_metadata=True):
         spaceAfter=20
     )
     
+    return title_style, heading_style, content_style, metadata_style
+
+def create_pdf(conversation, include_metadata=True):
+    """Create a PDF from the conversation content with optional metadata."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    
+    title_style, heading_style, content_style, metadata_style = get_pdf_styles()
+    
     story = []
     story.append(Paragraph("ChatGPT Conversation", title_style))
     
@@ -96,64 +134,204 @@ def create_pdf(conversation, include_metadata=True):
             
             story.append(Paragraph(clean_role, heading_style))
             
-            paragraphs = clean_message.split('\n')
-            for para in paragraphs:
-                if para.strip():
-                    story.append(Paragraph(para.strip(), content_style))
+            body = '<br/>'.join(line.strip() for line in clean_message.split('\n') if line.strip())
+            if body:
+                story.append(Paragraph(body, content_style))
             
             story.append(Spacer(1, 12))
+        
+        doc.build(story)
     
     except Exception as e:
         st.error(f"Error creating PDF: {str(e)}")
         return None
     
-    doc.build(story)
     buffer.seek(0)
     return buffer
 
-def extract_conversation(url):
-    """Extract conversation content from a shared ChatGPT URL."""
-    try:
-        with st.spinner("Initializing browser..."):
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--disable-software-rasterizer')
-            chrome_options.add_argument('--disable-extensions')
-            chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--start-maximized')
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            driver = webdriver.Chrome(options=chrome_options)
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def build_pdf(conversation, include_metadata=True):
+    """Render a conversation tuple to PDF bytes, cached on its contents."""
+    pdf_buffer = create_pdf(conversation, include_metadata)
+    return pdf_buffer.getvalue() if pdf_buffer else None
+
+def element_count_settled(locator):
+    """Wait condition met once the number of matching elements is non-zero and unchanged since the last poll."""
+    last_count = -1
+    
+    def _predicate(driver):
+        nonlocal last_count
+        count = len(driver.find_elements(*locator))
+        settled = count > 0 and count == last_count
+        last_count = count
+        return settled
+    
+    return _predicate
+
+def share_data_or_content(locator):
+    """Wait condition returning the share API JSON once its body has loaded, or True once matching elements render."""
+    pending_request_ids = set()
+    
+    def _predicate(driver):
+        # get_log drains the log, so share requests are remembered until their bodies finish loading
+        for entry in driver.get_log('performance'):
+            event = json.loads(entry['message'])['message']
+            method = event['method']
+            params = event.get('params', {})
+            if method == 'Network.responseReceived' and _SHARE_API_PATH in params['response']['url']:
+                pending_request_ids.add(params['requestId'])
+            elif method == 'Network.loadingFailed':
+                pending_request_ids.discard(params['requestId'])
+            elif method == 'Network.loadingFinished' and params['requestId'] in pending_request_ids:
+                pending_request_ids.discard(params['requestId'])
+                share_data = read_share_json(driver, params['requestId'])
+                if share_data:
+                    return share_data
         
-        with st.spinner("Loading conversation..."):
+        # Prefer the JSON while a share response body is still loading
+        if pending_request_ids:
+            return False
+        return bool(driver.find_elements(*locator))
+    
+    return _predicate
+
+@st.cache_resource(show_spinner="Initializing browser...")
+def get_driver():
+    """Create a headless Chrome driver that is reused across reruns and sessions."""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--disable-software-rasterizer')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--start-maximized')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_argument('--disable-background-networking')
+    chrome_options.add_argument('--disable-default-apps')
+    chrome_options.add_argument('--disable-sync')
+    chrome_options.add_argument('--disable-translate')
+    chrome_options.add_argument('--metrics-recording-only')
+    chrome_options.add_argument('--mute-audio')
+    chrome_options.add_argument('--no-first-run')
+    chrome_options.add_argument('--disable-renderer-backgrounding')
+    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    # Skip images and notification prompts; the extractor only reads text
+    chrome_options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2
+    })
+    # Return from driver.get at DOMContentLoaded instead of waiting for every subresource
+    chrome_options.page_load_strategy = 'eager'
+    # Record network events so the share API response can be read back over CDP
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    
+    # Use a preinstalled chromedriver when one exists to skip Selenium Manager's driver lookup
+    driver_path = os.environ.get('CHROMEDRIVER_PATH') or shutil.which('chromedriver')
+    service = Service(executable_path=driver_path) if driver_path else Service()
+    
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    atexit.register(driver.quit)
+    return driver
+
+def reset_driver(driver):
+    """Quit a failed shared driver and drop it from the cache so the next extraction starts a fresh one."""
+    get_driver.clear()
+    atexit.unregister(driver.quit)
+    try:
+        driver.quit()
+    except Exception:
+        pass  # The browser is usually already gone
+
+@st.cache_resource
+def get_driver_lock():
+    """Lock serializing access to the shared driver between sessions."""
+    return threading.Lock()
+
+def read_share_json(driver, request_id):
+    """Return the JSON body of a finished share API response, or None if it cannot be read."""
+    try:
+        response = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+    except WebDriverException:
+        return None
+    
+    body = response['body']
+    if response.get('base64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+def parse_share_json(data):
+    """Convert share API JSON into (role, message, is_edited) tuples."""
+    nodes = data.get('linear_conversation')
+    if not nodes:
+        # Walk the displayed branch from the last message back to the root
+        mapping = data.get('mapping') or {}
+        nodes = []
+        node_id = data.get('current_node')
+        while node_id in mapping and len(nodes) < len(mapping):
+            nodes.append(mapping[node_id])
+            node_id = mapping[node_id].get('parent')
+        nodes.reverse()
+    
+    conversation = []
+    for node in nodes:
+        message = node.get('message') or {}
+        role = (message.get('author') or {}).get('role')
+        parts = (message.get('content') or {}).get('parts') or []
+        text = '\n'.join(part for part in parts if isinstance(part, str)).strip()
+        if role in _ROLE_LABELS and text:
+            conversation.append((_ROLE_LABELS[role], text, False))
+    return conversation
+
+@st.cache_data(ttl=3600, show_spinner="Loading conversation...")
+def _fetch_conversation(url):
+    """Load a shared conversation as (role, message, is_edited) tuples, cached per URL."""
+    with get_driver_lock():
+        # Fetch the driver under the lock so no session keeps a reference to one that was reset
+        driver = get_driver()
+        try:
+            driver.delete_all_cookies()
+            driver.get_log('performance')  # Discard events left over from earlier loads
             driver.get(url)
-            wait = WebDriverWait(driver, 20)
+            wait = WebDriverWait(driver, 20, poll_frequency=0.25)
+            
+            # With eager page loads the share API may still be in flight, so wait for it or the content
+            share_data = wait.until(share_data_or_content((By.CSS_SELECTOR, "div[class*='markdown']")))
             
-            # Wait for the content to load
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='markdown']")))
-            time.sleep(2)  # Additional wait to ensure content is fully loaded
+            # Read the conversation straight from the share API response when possible
+            if isinstance(share_data, dict):
+                conversation = parse_share_json(share_data)
+                if conversation:
+                    return conversation
             
-            conversation_elements = driver.find_elements(By.CSS_SELECTOR, "div[class*='markdown']")
-            role_elements = driver.find_elements(By.CSS_SELECTOR, "div[class*='font-semibold']")
+            # Wait for the rendered content to stop growing
+            wait.until(element_count_settled((By.CSS_SELECTOR, "div[class*='markdown']")))
+            
+            pairs = driver.execute_script(_EXTRACT_CONVERSATION_JS)
         
-        conversation = []
-        for idx, content in enumerate(conversation_elements):
-            role = role_elements[idx].text if idx < len(role_elements) else "Unknown"
-            message = content.text.strip()
-            conversation.append([role, message, False])
+        except TimeoutException:
+            # The page was slow, not the browser; keep the driver
+            raise
         
-        return conversation
+        except WebDriverException:
+            reset_driver(driver)
+            raise
+    
+    conversation = [(role, message.strip(), False) for role, message in pairs]
+    return conversation
+
+def extract_conversation(url):
+    """Extract conversation content from a shared ChatGPT URL."""
+    try:
+        return tuple(_fetch_conversation(url))
     
     except Exception as e:
         st.error(f"An error occurred while extracting the conversation: {str(e)}")
         return None
-    
-    finally:
-        if 'driver' in locals():
-            driver.quit()
 
 # Streamlit UI setup
 st.set_page_config(
@@ -188,6 +366,10 @@ st.write("Enter a ChatGPT share link to extract, edit, and download the conversa
 # Initialize session state
 if 'conversation' not in st.session_state:
     st.session_state.conversation = None
+if 'original_hashes' not in st.session_state:
+    st.session_state.original_hashes = []
+if 'extracted_urls' not in st.session_state:
+    st.session_state.extracted_urls = {}
 
 # Input and processing
 url = st.text_input("ChatGPT Share Link", placeholder="https://chat.openai.com/share/...")
@@ -201,44 +383,69 @@ if st.button("Extract Conversation"):
             st.error("Invalid ChatGPT share URL format. Please check the URL and try again.")
             st.info("Make sure the URL starts with 'https://' and follows the format: https://chat.openai.com/share/[ID]")
         else:
-            st.session_state.conversation = extract_conversation(validated_url)
+            # Reuse conversations already extracted in this session
+            if validated_url in st.session_state.extracted_urls:
+                st.session_state.conversation = st.session_state.extracted_urls[validated_url]
+            else:
+                st.session_state.conversation = extract_conversation(validated_url)
+                if st.session_state.conversation:
+                    st.session_state.extracted_urls[validated_url] = st.session_state.conversation
+            
+            # Drop the editor's widget state so it shows the newly loaded conversation
+            for key in list(st.session_state.keys()):
+                if key.startswith(('role_', 'message_')):
+                    del st.session_state[key]
             
             if st.session_state.conversation:
-                pdf_buffer = create_pdf(st.session_state.conversation)
-                if pdf_buffer:
+                st.session_state.original_hashes = [
+                    (hash(role), hash(message)) for role, message, _ in st.session_state.conversation
+                ]
+                pdf_data = build_pdf(st.session_state.conversation)
+                if pdf_data:
                     st.download_button(
                         label="Download Original PDF",
-                        data=pdf_buffer,
+                        data=pdf_data,
                         file_name="chatgpt_conversation_original.pdf",
                         mime="application/pdf"
                     )
 
 # Display and edit conversation
-if st.session_state.conversation:
+@st.fragment
+def conversation_editor():
+    """Render the edit form and download button; submitting reruns only this fragment."""
     st.subheader("Edit Conversation")
-    edited_conversation = []
     
-    for idx, (role, message, is_edited) in enumerate(st.session_state.conversation):
-        col1, col2 = st.columns([1, 4])
+    # Edits are batched in a form so typing does not rerun the script or rebuild the PDF
+    with st.form("edit_form"):
+        edited_conversation = []
         
-        with col1:
-            edited_role = st.text_input(f"Prompt {idx+1}", value=role, key=f"role_{idx}")
-        
-        with col2:
-            edited_message = st.text_area(f"Response {idx+1}", value=message, key=f"message_{idx}")
-        
-        is_edited = (edited_role != role) or (edited_message != message)
-        edited_conversation.append([edited_role, edited_message, is_edited])
+        for idx, (role, message, is_edited) in enumerate(st.session_state.conversation):
+            col1, col2 = st.columns([1, 4])
+            
+            with col1:
+                edited_role = st.text_input(f"Prompt {idx+1}", value=role, key=f"role_{idx}")
+            
+            with col2:
+                edited_message = st.text_area(f"Response {idx+1}", value=message, key=f"message_{idx}")
+            
+            is_edited = (hash(edited_role), hash(edited_message)) != st.session_state.original_hashes[idx]
+            edited_conversation.append((edited_role, edited_message, is_edited))
+            
+            st.markdown("---")
         
-        st.markdown("---")
+        submitted = st.form_submit_button("Rebuild PDF")
     
-    st.session_state.conversation = edited_conversation
+    if submitted:
+        st.session_state.conversation = tuple(edited_conversation)
     
-    pdf_buffer = create_pdf(edited_conversation)
-    if pdf_buffer:
+    pdf_data = build_pdf(st.session_state.conversation)
+    if pdf_data:
         st.download_button(
             label="Download Edited PDF",
-            data=pdf_buffer,
+            data=pdf_data,
             file_name="chatgpt_conversation_edited.pdf",
             mime="application/pdf"
         )
+
+if st.session_state.conversation:
+    conversation_editor()